@@ -9,13 +9,28 @@
 # - 3D LUT (3DL) reference: http://download.autodesk.com/us/systemdocs/pdf/lustre_color_management_user_guide.pdf#page=14
 
 import sys
+import math
+import functools
+import logging
 import numbers
+import threading
 from array import array
-from decimal import Decimal
-import math
+import numpy as np
 import png
 import click
 
+log = logging.getLogger(__name__)
+
+
+# The largest sample value for each supported PNG bit depth.
+PNG_MAX_VALUE = {
+    8: 2**8-1,
+    16: 2**16-1,
+}
+
+# The number of pixels ColorLUT.apply_to_image() interpolates at a time.
+APPLY_CHUNK_SIZE = 2**14
+
 
 def fatal_error(message):
     """
@@ -28,21 +43,49 @@ def is_perfect_six_root(n):
     c = int(n**(1/6.))
     return (c**6 == n) or ((c+1)**6 == n)
 
-def write_png(path, data, width, height, bit_depth):
+def integer_cube_root(n):
+    """
+    Return the exact integer cube root of `n`, or None if `n` is not a
+    perfect cube.
+    """
+    c = int(round(n**(1/3.)))
+    for candidate in (c-1, c, c+1):
+        if candidate**3 == n:
+            return candidate
+    return None
+
+def write_png(path, data, width, height, bit_depth, compression=1):
     """
-    Create an "identity" PNG file.
+    Write RGB sample data to a PNG file.
+
+    The data is handed to pypng as rows of a (height, width*3) array, so it
+    never needs to be converted into a list of Python ints first.
+
+    Color LUT images are smooth ramps which compress well even at the
+    fastest zlib level, so `compression` defaults to 1 rather than zlib's
+    default of 6.
     """
-    writer = png.writer(
+    dtype = np.uint8 if bit_depth <= 8 else np.uint16
+    rows = np.asarray(data, dtype=dtype).reshape(height, width*3)
+    writer = png.Writer(
         width=width,
         height=height,
         bitdepth=bit_depth,
+        greyscale=False,
+        compression=compression,
     )
-    writer.write_array(path, data)
+    with open(path, 'wb') as pngfile:
+        writer.write(pngfile, rows)
 
 
+@functools.lru_cache(maxsize=None)
 def uniform_intervals(end, samples, floating_point=False):
     """
     Make `samples` uniformly distributed numbers from 0 to `end`.
+
+    Only a handful of (end, samples) pairs are ever used, so the results are
+    cached.  They are returned as a tuple so that the cached value cannot be
+    modified by a caller.
     """
     dist = end/float(samples-1)
     values = [dist*i for i in range(samples)]
@@ -53,103 +96,214 @@ def uniform_intervals(end, samples, floating_point=False):
             error_frac = abs(float(actual_dist)/dist - 1.0)
             if error_frac > 0.07:
                 raise ValueError('input parameters to uniform_intervals would yield a non-uniform distribution.')
-    return values
+    return tuple(values)
 
 
-class Value3D(object):
+# The original function and options for each function to be compiled by
+# _load_numba(), by name.
+_jit_options = {}
 
-    def __init__(self, components):
-        self.components = tuple(components)
+_numba_lock = threading.Lock()
 
-    def __str__(self):
-        return 'Value3D({},{},{})'.format(*self.components)
+_prange = range
 
-    def __bytes__(self):
-        return self.__str__()
 
-    def __repr__(self):
-        return self.__str__()
+def _jit(**options):
+    """
+    Mark the decorated function to be compiled with numba by _load_numba().
+    """
+    def decorator(func):
+        _jit_options[func.__name__] = (func, options)
+        return func
+    return decorator
 
-    def __iter__(self):
-        return iter(self.components)
 
-    def __add__(self, y):
-        return Value3D(
-            (
-                self.components[0] + y.components[0],
-                self.components[1] + y.components[1],
-                self.components[2] + y.components[2],
-            )
-        )
+@functools.lru_cache(maxsize=None)
+def _load_numba():
+    """
+    Import numba and compile the functions marked with _jit(), returning
+    whether numba is installed.
 
-    def __mul__(self, y):
-        return Value3D(
-            (
-                self.components[0] * y,
-                self.components[1] * y,
-                self.components[2] * y,
-            )
-        )
+    Importing numba takes longer than everything else the CLI does, so this
+    is deferred until something actually interpolates.  The compiled
+    functions replace the plain ones as module globals, so kernels calling
+    each other resolve to the compiled versions.
+
+    lru_cache does not stop several threads running the first call at once,
+    so that is serialized with a lock, and each function is compiled from the
+    original rather than from whatever is in the module globals.
+    """
+    global _prange
+    with _numba_lock:
+        try:
+            import numba
+        except ImportError:
+            return False
+        _prange = numba.prange
+        module = globals()
+        for name, (func, options) in _jit_options.items():
+            module[name] = numba.njit(cache=True, **options)(func)
+        return True
+
+
+@_jit(inline='always')
+def _locate_point(inv_sample_distance, last_cell, value):
+    """
+    Find the lower sample index and the fractional distance past it for a
+    single input value, as ColorLUT._locate() does for floats.
+    """
+    position = value * inv_sample_distance
+    idx = min(max(int(math.floor(position)), 0), last_cell)
+    return idx, position - idx
+
+
+@_jit(inline='always')
+def _locate_point_exact(input_domain, last_cell, value):
+    """
+    Find the lower sample index and the fractional distance past it for a
+    single integer input value, as ColorLUT._locate() does for integers.
+    """
+    scaled = np.int64(value) * (last_cell + 1)
+    idx = min(max(scaled // input_domain, 0), last_cell)
+    return idx, (scaled - idx*input_domain) / input_domain
 
-    def __rmul__(self, x):
-        return self.__mul__(x)
+
+@_jit(inline='always')
+def _trilinear_cell(cube, r_0_idx, g_0_idx, b_0_idx, r_d, g_d, b_d, c):
+    """
+    Trilinearly interpolate within the cell of an [r, g, b] cube whose lower
+    corner is at the given indices, storing the 3 output channels in `c`.
+
+    This mirrors ColorLUT.get_interpolated_color_value() for one point, but
+    as a free function over plain values so that it can be compiled with
+    numba when that is available.
+    """
+    one_minus_r_d = 1.0 - r_d
+    one_minus_g_d = 1.0 - g_d
+    one_minus_b_d = 1.0 - b_d
+
+    for ch in range(3):
+        c_00 = cube[r_0_idx, g_0_idx, b_0_idx, ch]*one_minus_r_d + cube[r_0_idx+1, g_0_idx, b_0_idx, ch]*r_d
+        c_01 = cube[r_0_idx, g_0_idx, b_0_idx+1, ch]*one_minus_r_d + cube[r_0_idx+1, g_0_idx, b_0_idx+1, ch]*r_d
+        c_10 = cube[r_0_idx, g_0_idx+1, b_0_idx, ch]*one_minus_r_d + cube[r_0_idx+1, g_0_idx+1, b_0_idx, ch]*r_d
+        c_11 = cube[r_0_idx, g_0_idx+1, b_0_idx+1, ch]*one_minus_r_d + cube[r_0_idx+1, g_0_idx+1, b_0_idx+1, ch]*r_d
+
+        c_0 = c_00*one_minus_g_d + c_10*g_d
+        c_1 = c_01*one_minus_g_d + c_11*g_d
+
+        c[ch] = c_0*one_minus_b_d + c_1*b_d
+
+
+@_jit()
+def _trilinear_into(cube, inv_sample_distance, r_input, g_input, b_input, c):
+    """
+    Trilinearly interpolate a single input color within an [r, g, b] cube,
+    storing the 3 output channels in `c`.
+    """
+    last_cell = cube.shape[0] - 2
+    r_0_idx, r_d = _locate_point(inv_sample_distance, last_cell, r_input)
+    g_0_idx, g_d = _locate_point(inv_sample_distance, last_cell, g_input)
+    b_0_idx, b_d = _locate_point(inv_sample_distance, last_cell, b_input)
+    _trilinear_cell(cube, r_0_idx, g_0_idx, b_0_idx, r_d, g_d, b_d, c)
+
+
+@_jit()
+def _trilinear_into_exact(cube, input_domain, r_input, g_input, b_input, c):
+    """
+    Same as _trilinear_into(), but for integer inputs and an integer input
+    domain, which are located exactly in integer arithmetic.
+    """
+    last_cell = cube.shape[0] - 2
+    r_0_idx, r_d = _locate_point_exact(input_domain, last_cell, r_input)
+    g_0_idx, g_d = _locate_point_exact(input_domain, last_cell, g_input)
+    b_0_idx, b_d = _locate_point_exact(input_domain, last_cell, b_input)
+    _trilinear_cell(cube, r_0_idx, g_0_idx, b_0_idx, r_d, g_d, b_d, c)
+
+
+@_jit()
+def _trilinear_point(cube, inv_sample_distance, r_input, g_input, b_input):
+    """
+    Trilinearly interpolate a single input color, returning a new array.
+    """
+    c = np.empty(3)
+    _trilinear_into(cube, inv_sample_distance, r_input, g_input, b_input, c)
+    return c
+
+
+@_jit()
+def _trilinear_point_exact(cube, input_domain, r_input, g_input, b_input):
+    """
+    Same as _trilinear_point(), but for integer inputs.
+    """
+    c = np.empty(3)
+    _trilinear_into_exact(cube, input_domain, r_input, g_input, b_input, c)
+    return c
+
+
+@_jit(parallel=True)
+def _trilinear_bulk(cube, inv_sample_distance, r_input, g_input, b_input, out):
+    """
+    Trilinearly interpolate flat arrays of input colors into the rows of
+    `out`, fusing the corner gathers and lerps into one pass per sample and
+    spreading the samples across threads.
+    """
+    for i in _prange(r_input.shape[0]):
+        _trilinear_into(cube, inv_sample_distance, r_input[i], g_input[i], b_input[i], out[i])
 
 
-def index_3d(data, size, r_idx, g_idx, b_idx):
+@_jit(parallel=True)
+def _trilinear_bulk_exact(cube, input_domain, r_input, g_input, b_input, out):
     """
-    Index a flattened 3-channel 3D cubic matrix.
+    Same as _trilinear_bulk(), but for integer inputs.
     """
-    idx = (r_idx) + (size * g_idx) + (size**2 * b_idx)
-    idx *= 3
-    # click.echo('index_3d(): size, r_idx, g_idx, b_idx = {},{},{},{}'.format(size, r_idx, g_idx, b_idx))
-    # click.echo('index_3d(): idx = {}'.format(idx))
-    return data[idx:idx+3]
+    for i in _prange(r_input.shape[0]):
+        _trilinear_into_exact(cube, input_domain, r_input[i], g_input[i], b_input[i], out[i])
 
 
 class ColorLUT(object):
     """
     """
     def __init__(self, data, sample_count=None, input_domain=None, red_increments_fastest=True):
-        if not isinstance(data, array) or not isinstance(data[0], numbers.Number):
-            raise ValueError('data parameter should be a flat list of numbers.')
+        if isinstance(data, array):
+            if data.typecode not in 'bBhHiIlLqQfd':
+                raise ValueError('data parameter should be a flat array of numbers.')
+            data = np.frombuffer(data, dtype=data.typecode)
+        if not isinstance(data, np.ndarray) or data.ndim != 1:
+            raise ValueError('data parameter should be a flat array of numbers.')
         if not isinstance(sample_count, int):
             raise ValueError('sample_count parameter should be of type int.')
         if not isinstance(input_domain, numbers.Number):
             raise ValueError('input_domain parameter should be a number.')
         if isinstance(input_domain, numbers.Integral):
-            if data.typecode not in 'bBhHiIlL':
+            if not np.issubdtype(data.dtype, np.integer):
                 raise ValueError('input_domain parameter should have the same type as the data.')
         else:
-            if data.typecode not in 'fd':
+            if not np.issubdtype(data.dtype, np.floating):
                 raise ValueError('input_domain parameter should have the same type as the data.')
         if not len(data) == 3 * (sample_count**3):
             raise ValueError('The sample intervals do not appear to match the matrix dimensions.')
-        self.data = data
+        cube = data.reshape(sample_count, sample_count, sample_count, 3)
+        if red_increments_fastest:
+            # The flat data is laid out [b, g, r].  Swap the axes so the cube
+            # is always indexed [r, g, b]; this is a view, not a copy.
+            cube = cube.transpose(2, 1, 0, 3)
+        self.cube = cube
         self.sample_count = sample_count
         self.input_domain = input_domain
-        self.red_increments_fastest = red_increments_fastest
-        if data.typecode in 'fd':
-            self.datatype = numbers.Real
-        elif data.typecode in 'bBhHiIlL':
-            self.datatype = numbers.Integral
+        self.dtype = data.dtype
         self.sample_distance = self.input_domain / float(self.sample_count-1)
+        self._inv_sample_distance = 1.0 / self.sample_distance
 
     def get_color_value_from_index(self, r_idx, g_idx, b_idx):
         """
         Determine the output color value given 3D matrix indices.
         """
-        if not self.red_increments_fastest:
-            r_idx, b_idx = b_idx, r_idx
-        color_value = Value3D(index_3d(self.data, self.sample_count, r_idx, g_idx, b_idx))
-        # click.echo('get_color_value_from_index(): r_idx,g_idx,b_idx = {},{},{}'.format(r_idx,g_idx,b_idx))
-        # click.echo('get_color_value_from_index(): color_value = {}'.format(str(color_value)))
-        return color_value
+        return self.cube[r_idx, g_idx, b_idx]
 
-    def get_interpolated_color_value(self, r_input, g_input, b_input):
+    def _locate(self, value):
         """
-        Determine the output color value using trilinear interpolation.
-
-        Algorithm adapted from https://en.wikipedia.org/wiki/Trilinear_interpolation
+        Find the lower sample index and the fractional distance past it for
+        each input value.
         """
         # On wikipedia, the equations for v_d were:
         #
@@ -157,119 +311,321 @@ class ColorLUT(object):
         #   g_d = ( g - g_0 ) / ( g_1 - g_0 )
         #   b_d = ( b - b_0 ) / ( b_1 - b_0 )
         #
-        # but v-v_0 is equivalent to math.remainder(v, self.sample_distance),
-        # and v_1-v_0 is equivalent to self.sample_distance,
-        # therefore, v_d = float(Decimal(v_input) % Decimal(self.sample_distance)) / self.sample_distance.
+        # but v_1-v_0 is equivalent to self.sample_distance, so v_d is just
+        # the fractional part of v_input / self.sample_distance.  Scale by
+        # the cached reciprocal once and derive both the index and v_d from
+        # that same result.
         #
         # Furthermore, we need to handle the border case where v_input == the
-        # maximum possible value (i.e. self.input_domain).
-        if r_input == self.input_domain:
-            r_0_idx = self.sample_count - 2
-            r_d = 1
-        else:
-            r_0_idx = math.trunc(r_input/self.sample_distance)
-            r_d = float(Decimal(r_input) % Decimal(self.sample_distance)) / self.sample_distance
+        # maximum possible value (i.e. self.input_domain).  Clamping the index
+        # to the last cell covers that, since v_d then simply comes out as 1.
+        # Flooring rather than truncating keeps v_d from going negative.
+        #
+        # Integer inputs, such as pixel values, are located exactly in integer
+        # arithmetic when the input domain is an integer too, since then
+        # v_input * (sample_count-1) == r_0 * input_domain + remainder.
+        #
+        # Floating point inputs keep their precision, so float32 inputs are
+        # interpolated in float32 throughout.
+        value = np.asarray(value)
+        if np.issubdtype(value.dtype, np.integer) and isinstance(self.input_domain, numbers.Integral):
+            scaled = value.astype(np.int64) * (self.sample_count - 1)
+            cell = np.clip(scaled // self.input_domain, 0, self.sample_count - 2)
+            frac = (scaled - cell*self.input_domain) / float(self.input_domain)
+            return cell.astype(np.intp), frac
+        if not np.issubdtype(value.dtype, np.floating):
+            value = value.astype(float)
+        position = value * self._inv_sample_distance
+        cell = np.clip(np.floor(position), 0, self.sample_count - 2)
+        return cell.astype(np.intp), position - cell
+
+    def _locates_exactly(self, value):
+        """
+        Determine whether _locate() places the input using exact integer
+        arithmetic.
+        """
+        return (
+            isinstance(self.input_domain, numbers.Integral)
+            and np.issubdtype(np.asarray(value).dtype, np.integer)
+        )
 
-        if g_input == self.input_domain:
-            g_0_idx = self.sample_count - 2
-            g_d = 1
-        else:
-            g_0_idx = math.trunc(g_input/self.sample_distance)
-            g_d = float(Decimal(g_input) % Decimal(self.sample_distance)) / self.sample_distance
+    def get_interpolated_color_value(self, r_input, g_input, b_input):
+        """
+        Determine the output color value using trilinear interpolation.
 
-        if b_input == self.input_domain:
-            b_0_idx = self.sample_count - 2
-            b_d = 1
-        else:
-            b_0_idx = math.trunc(b_input/self.sample_distance)
-            b_d = float(Decimal(b_input) % Decimal(self.sample_distance)) / self.sample_distance
+        The color value is returned as an array of its 3 channels.  The inputs
+        may also be equally shaped arrays, in which case all of them are
+        interpolated at once and an array with an extra trailing axis of
+        length 3 is returned.
+
+        Algorithm adapted from https://en.wikipedia.org/wiki/Trilinear_interpolation
+        """
+        if _load_numba():
+            exact = {self._locates_exactly(value) for value in (r_input, g_input, b_input)}
+            # The kernels locate all three inputs the same way, so the rare
+            # mix of integer and float inputs is left to the code below.
+            if len(exact) == 1:
+                return self._get_interpolated_color_value_compiled(r_input, g_input, b_input, exact.pop())
+
+        r_0_idx, r_d = self._locate(r_input)
+        g_0_idx, g_d = self._locate(g_input)
+        b_0_idx, b_d = self._locate(b_input)
 
         r_1_idx = r_0_idx + 1
         g_1_idx = g_0_idx + 1
         b_1_idx = b_0_idx + 1
 
-        c_000 = self.get_color_value_from_index(r_0_idx, g_0_idx, b_0_idx)
-        c_001 = self.get_color_value_from_index(r_0_idx, g_0_idx, b_1_idx)
-        c_010 = self.get_color_value_from_index(r_0_idx, g_1_idx, b_0_idx)
-        c_011 = self.get_color_value_from_index(r_0_idx, g_1_idx, b_1_idx)
-        c_100 = self.get_color_value_from_index(r_1_idx, g_0_idx, b_0_idx)
-        c_101 = self.get_color_value_from_index(r_1_idx, g_0_idx, b_1_idx)
-        c_110 = self.get_color_value_from_index(r_1_idx, g_1_idx, b_0_idx)
-        c_111 = self.get_color_value_from_index(r_1_idx, g_1_idx, b_1_idx)
+        cube = self.cube
+        c_000 = cube[r_0_idx, g_0_idx, b_0_idx]
+        c_001 = cube[r_0_idx, g_0_idx, b_1_idx]
+        c_010 = cube[r_0_idx, g_1_idx, b_0_idx]
+        c_011 = cube[r_0_idx, g_1_idx, b_1_idx]
+        c_100 = cube[r_1_idx, g_0_idx, b_0_idx]
+        c_101 = cube[r_1_idx, g_0_idx, b_1_idx]
+        c_110 = cube[r_1_idx, g_1_idx, b_0_idx]
+        c_111 = cube[r_1_idx, g_1_idx, b_1_idx]
+
+        # Broadcast the weights over the color channels, and compute each
+        # complementary weight once rather than once per lerp.
+        r_d = r_d[..., np.newaxis]
+        g_d = g_d[..., np.newaxis]
+        b_d = b_d[..., np.newaxis]
+        one_minus_r_d = 1.0 - r_d
+        one_minus_g_d = 1.0 - g_d
+        one_minus_b_d = 1.0 - b_d
+
+        c_00 = c_000*one_minus_r_d + c_100*r_d
+        c_01 = c_001*one_minus_r_d + c_101*r_d
+        c_10 = c_010*one_minus_r_d + c_110*r_d
+        c_11 = c_011*one_minus_r_d + c_111*r_d
+
+        c_0 = c_00*one_minus_g_d + c_10*g_d
+        c_1 = c_01*one_minus_g_d + c_11*g_d
+
+        c = c_0*one_minus_b_d + c_1*b_d
 
-        c_00 = c_000*(1.0-r_d) + c_100*r_d
-        c_01 = c_001*(1.0-r_d) + c_101*r_d
-        c_10 = c_010*(1.0-r_d) + c_110*r_d
-        c_11 = c_011*(1.0-r_d) + c_111*r_d
+        return c
 
-        c_0 = c_00*(1.0-g_d) + c_10*g_d
-        c_1 = c_01*(1.0-g_d) + c_11*g_d
+    def _get_interpolated_color_value_compiled(self, r_input, g_input, b_input, exact=False):
+        """
+        Same as get_interpolated_color_value(), but using the numba kernels.
 
-        c = c_0*(1.0-b_d) + c_1*b_d
+        If `exact` is set, the inputs are integers located with integer
+        division, as _locate() does.
+        """
+        # The kernels index all three inputs alike, so they must be
+        # broadcast to a common shape first, just as the NumPy operations in
+        # get_interpolated_color_value() would.
+        r_input, g_input, b_input = np.broadcast_arrays(r_input, g_input, b_input)
+        # Return the same dtype as the NumPy operations would: float32 inputs
+        # to a LUT of 8 or 16-bit samples stay float32, but nothing is ever
+        # narrowed to that from a float64 input or LUT.
+        dtype = np.result_type(self.cube.dtype, r_input.dtype, g_input.dtype, b_input.dtype)
+        if not np.issubdtype(dtype, np.floating):
+            dtype = np.dtype(float)
+        if exact:
+            location = self.input_domain
+            input_dtype = np.int64
+            point_kernel, bulk_kernel = _trilinear_point_exact, _trilinear_bulk_exact
+        else:
+            location = self._inv_sample_distance
+            input_dtype = dtype
+            point_kernel, bulk_kernel = _trilinear_point, _trilinear_bulk
+        if r_input.ndim == 0:
+            # A single point is cheaper through the compiled kernel than
+            # through a handful of 0-d array operations.
+            c = point_kernel(
+                self.cube,
+                location,
+                r_input.astype(input_dtype).item(),
+                g_input.astype(input_dtype).item(),
+                b_input.astype(input_dtype).item(),
+            )
+            return c.astype(dtype, copy=False)
+        shape = r_input.shape
+        r_input = np.ravel(np.asarray(r_input, dtype=input_dtype))
+        g_input = np.ravel(np.asarray(g_input, dtype=input_dtype))
+        b_input = np.ravel(np.asarray(b_input, dtype=input_dtype))
+        out = np.empty((r_input.shape[0], 3), dtype=dtype)
+        bulk_kernel(self.cube, location, r_input, g_input, b_input, out)
+        return out.reshape(shape + (3,))
+
+    def get_tetrahedral_color_value(self, r_input, g_input, b_input):
+        """
+        Determine the output color value using tetrahedral interpolation.
+
+        This splits each cell of the LUT into 6 tetrahedra sharing the
+        diagonal from c_000 to c_111, and only needs 4 corner values per
+        sample instead of the 8 used by trilinear interpolation.  Inputs are
+        handled the same way as get_interpolated_color_value().
+        """
+        r_0_idx, r_d = self._locate(r_input)
+        g_0_idx, g_d = self._locate(g_input)
+        b_0_idx, b_d = self._locate(b_input)
+
+        # The tetrahedron containing the input is selected by the order of
+        # the fractional parts.  Walk from c_000 to c_111 one axis at a
+        # time, taking the axis with the largest fraction first.
+        idx_0 = np.stack([r_0_idx, g_0_idx, b_0_idx], axis=-1)
+        fracs = np.stack([r_d, g_d, b_d], axis=-1)
+        order = np.argsort(-fracs, axis=-1)
+        weights = np.take_along_axis(fracs, order, axis=-1)
+        steps = np.eye(3, dtype=np.intp)
+        idx_1 = idx_0 + steps[order[..., 0]]
+        idx_2 = idx_1 + steps[order[..., 1]]
+
+        # The corners are differenced below, so they must not stay unsigned.
+        cube = self.cube
+        c_000 = cube[r_0_idx, g_0_idx, b_0_idx].astype(fracs.dtype)
+        c_1 = cube[idx_1[..., 0], idx_1[..., 1], idx_1[..., 2]].astype(fracs.dtype)
+        c_2 = cube[idx_2[..., 0], idx_2[..., 1], idx_2[..., 2]].astype(fracs.dtype)
+        c_111 = cube[r_0_idx+1, g_0_idx+1, b_0_idx+1].astype(fracs.dtype)
+
+        w_0 = weights[..., 0, np.newaxis]
+        w_1 = weights[..., 1, np.newaxis]
+        w_2 = weights[..., 2, np.newaxis]
+        c = c_000 + w_0*(c_1-c_000) + w_1*(c_2-c_1) + w_2*(c_111-c_2)
 
         return c
 
+    def _interpolator(self, interpolation):
+        """
+        Look up the interpolation method with the given name.
+        """
+        if interpolation == 'trilinear':
+            return self.get_interpolated_color_value
+        elif interpolation == 'tetrahedral':
+            return self.get_tetrahedral_color_value
+        raise ValueError('Not an appropriate interpolation method: {}'.format(interpolation))
+
+    def apply_to_image(self, image, interpolation='trilinear'):
+        """
+        Transform a (height, width, 3) image array through this color LUT.
+
+        The image samples must be in the same domain as the LUT input.  Every
+        pixel is interpolated in one batch, and the result has the same shape
+        and dtype as the image.
+        """
+        image = np.asarray(image)
+        if image.ndim != 3 or image.shape[-1] != 3:
+            raise ValueError('image parameter should have shape (height, width, 3).')
+        interpolate = self._interpolator(interpolation)
+        round_result = np.issubdtype(image.dtype, np.integer)
+        if round_result and image.dtype.itemsize == 1:
+            # 8-bit samples are far coarser than float32 precision, so
+            # interpolate them in float32 to halve the memory traffic.  16-bit
+            # samples are not: float32 would round some of them differently.
+            work_dtype = np.float32
+        else:
+            # Wider integer samples are located exactly in integer
+            # arithmetic, and float samples keep their own precision.
+            work_dtype = image.dtype
+        # Work through the pixels in fixed-size chunks, so the temporary
+        # arrays stay small enough to remain in cache however large the image.
+        pixels = image.reshape(-1, 3)
+        result = np.empty(pixels.shape, dtype=image.dtype)
+        for start in range(0, len(pixels), APPLY_CHUNK_SIZE):
+            chunk = pixels[start:start+APPLY_CHUNK_SIZE].astype(work_dtype, copy=False)
+            values = interpolate(chunk[:, 0], chunk[:, 1], chunk[:, 2])
+            if round_result:
+                values = np.rint(values)
+            result[start:start+APPLY_CHUNK_SIZE] = values
+        return result.reshape(image.shape)
+
+    def _resample_trilinear(self, output_sample_count, scaling_factor=1.0):
+        """
+        Trilinearly resample the cube onto a regular grid with
+        `output_sample_count` samples along each axis, multiplying the
+        results by `scaling_factor`.
+
+        Trilinear interpolation is separable, so rather than fetching 8
+        corners for every output sample, interpolate along the red, green and
+        blue axes in turn.  Each intermediate lerp is then computed once and
+        shared by every output sample that needs it.  The operations are the
+        same ones get_interpolated_color_value() performs, in the same order.
+
+        The scaling is folded into the weights of the last lerp, which are
+        only `output_sample_count` long, instead of taking another pass over
+        the whole output.
+        """
+        steps = np.arange(output_sample_count) * (self.input_domain/float(output_sample_count-1))
+        idx, frac = self._locate(steps)
+        cube = self.cube
+        for axis in range(3):
+            shape = [1, 1, 1, 1]
+            shape[axis] = output_sample_count
+            weight = frac.reshape(shape)
+            one_minus_weight = 1.0 - weight
+            if axis == 2:
+                weight = weight * scaling_factor
+                one_minus_weight = one_minus_weight * scaling_factor
+            cube = (
+                np.take(cube, idx, axis=axis)*one_minus_weight
+                + np.take(cube, idx+1, axis=axis)*weight
+            )
+        return cube
+
     def get_values_translated(
             self,
             increment_red_fastest=True,
             output_sample_count=None,
             output_domain=None,
+            interpolation='trilinear',
         ):
         """
-        Make an iterable of output color values in sequence.
+        Make an (N, 3) array of output color values in sequence.
 
         If necessary, reorder the output data values in order to make them
         correspond to red/blue input channels incrementing most/least rapidly
         by default.  Switch increment_red_fastest=False for the opposite
         behavior
+
+        When the output sample count differs from our own, the output values
+        are interpolated using either 'trilinear' or 'tetrahedral'
+        interpolation.
         """
+        interpolate = self._interpolator(interpolation)
         interpolate_output = output_sample_count != self.sample_count
         scale_output = output_domain != self.input_domain
 
         scaling_factor = output_domain / float(self.input_domain)
 
-        if increment_red_fastest:
-            indexes = (
-                (r, g, b)
-                for b in range(output_sample_count)
-                for g in range(output_sample_count)
-                for r in range(output_sample_count)
-            )
+        if not interpolate_output:
+            cube = self.cube
+        elif interpolation == 'trilinear':
+            cube = self._resample_trilinear(output_sample_count, scaling_factor)
+            scale_output = False
         else:
-            indexes = (
-                (r, g, b)
-                for r in range(output_sample_count)
-                for g in range(output_sample_count)
-                for b in range(output_sample_count)
-            )
+            # Interpolate the full grid of output samples in one batch.  With
+            # 'ij' indexing the result comes out indexed [r, g, b] just like
+            # our own cube.
+            steps = np.arange(output_sample_count) * (self.input_domain/float(output_sample_count-1))
+            r, g, b = np.meshgrid(steps, steps, steps, indexing='ij')
+            cube = interpolate(r, g, b)
 
-        if interpolate_output:
-            input_values = (
-                Value3D(idx)*(self.input_domain/float(output_sample_count-1))
-                for idx in indexes
-            )
-            output_values = (
-                self.get_interpolated_color_value(*input_value)
-                for input_value in input_values
-            )
+        if increment_red_fastest:
+            output_values = cube.transpose(2, 1, 0, 3).reshape(-1, 3)
         else:
-            output_values = (
-                self.get_color_value_from_index(*idx)
-                for idx in indexes
-            )
+            output_values = cube.reshape(-1, 3)
 
         if scale_output:
-            output_values = (
-                output_value*scaling_factor
-                for output_value in output_values
-            )
+            integral_output = isinstance(output_domain, numbers.Integral)
+            if integral_output and np.issubdtype(output_values.dtype, np.integer):
+                # Rescale between two integer domains exactly, rounding to
+                # the nearest output value, instead of going through float.
+                output_values = (
+                    output_values.astype(np.int64) * output_domain
+                    + self.input_domain // 2
+                ) // self.input_domain
+            else:
+                output_values = output_values * scaling_factor
 
         return output_values
 
     @classmethod
     def from_haldclut(cls, src):
         src_png = png.Reader(filename=src)
-        width, height, data, meta = src_png.read_flat()
+        width, height, rows, meta = src_png.read()
         if 'palette' in meta:
             raise ValueError('Then given PNG file uses a color palette. Refusing.')
         if 'gamma' in meta:
@@ -278,25 +634,28 @@ class ColorLUT(object):
             raise ValueError('Then given PNG file specifies a transparent color. Refusing.')
         if meta['alpha']:
             raise ValueError('Then given PNG file contains an alpha channel. Refusing.')
-        if meta['greyscale']:
-            def triple_generator(d):
-                for val in d:
-                    yield val
-                    yield val
-                    yield val
-            data = array(data.typecode, triple_generator(data))
-        if meta['bitdepth'] not in (8, 16):
+        if meta['bitdepth'] not in PNG_MAX_VALUE:
             raise ValueError('Then given PNG file specifies an unsupported bit depth. Refusing.')
         width_is_square_root_of_perfect_six_root = is_perfect_six_root(width**2)
         if width != height or not width_is_square_root_of_perfect_six_root:
             raise ValueError('The given PNG file does not have appropriate Hald CLUT dimensions. Refusing.')
-        sample_count = int(round((width**2)**(1./3)))
-        input_domain = 2**meta['bitdepth']-1
-        click.echo('from_haldclut(): PNG dimensions = {}x{}'.format(width, height))
-        click.echo('from_haldclut(): PNG bit depth = {}'.format(meta['bitdepth']))
-        click.echo('from_haldclut(): PNG array typecode = {}'.format(data.typecode))
-        click.echo('from_haldclut(): Inferred input domain = {}'.format(input_domain))
-        click.echo('from_haldclut(): Inferred 3D matrix dimensions = {0}x{0}x{0}'.format(sample_count))
+        # Copy each row straight into a preallocated buffer, rather than
+        # boxing every sample into a Python int with read_flat().
+        dtype = np.uint8 if meta['bitdepth'] == 8 else np.uint16
+        data = np.empty((height, width * meta['planes']), dtype=dtype)
+        for row_idx, row in enumerate(rows):
+            data[row_idx] = np.frombuffer(row, dtype=dtype)
+        data = data.reshape(-1)
+        if meta['greyscale']:
+            data = np.repeat(data, 3)
+        sample_count = integer_cube_root(width**2)
+        input_domain = PNG_MAX_VALUE[meta['bitdepth']]
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug('from_haldclut(): PNG dimensions = {}x{}'.format(width, height))
+            log.debug('from_haldclut(): PNG bit depth = {}'.format(meta['bitdepth']))
+            log.debug('from_haldclut(): PNG array dtype = {}'.format(data.dtype))
+            log.debug('from_haldclut(): Inferred input domain = {}'.format(input_domain))
+            log.debug('from_haldclut(): Inferred 3D matrix dimensions = {0}x{0}x{0}'.format(sample_count))
         return cls(data, sample_count=sample_count, input_domain=input_domain)
 
     @classmethod
@@ -309,33 +668,35 @@ class ColorLUT(object):
     def write_3dl(self, dest):
         output_domain = 1023
         sample_intervals = uniform_intervals(output_domain, self.sample_count)
-        color_value_gen = self.get_values_translated(
+        color_values = self.get_values_translated(
             increment_red_fastest=False,
             output_sample_count=self.sample_count,
             output_domain=output_domain,
         )
-        with open(dest, 'w') as destfile:
-            destfile.write('   '.join(str(v) for v in sample_intervals))
-            destfile.write('\n')
-            for color in color_value_gen:
-                line = ' '.join('{:.0f}'.format(v) for v in color)
-                destfile.write(line)
-                destfile.write('\n')
+        # 3DL values are integers, so round them all at once and format
+        # plain Python ints.  Build the whole file as bytes and write it out
+        # in one call; np.savetxt would format and write row by row.
+        color_values = np.rint(color_values).astype(np.int64)
+        lines = ['   '.join(str(v) for v in sample_intervals).encode('ascii')]
+        lines.extend(b'%d %d %d' % tuple(color) for color in color_values.tolist())
+        lines.append(b'')
+        with open(dest, 'wb') as destfile:
+            destfile.write(b'\n'.join(lines))
 
     def write_cube(self, dest):
         output_domain = 1.0
         output_sample_count = self.sample_count
-        color_value_gen = self.get_values_translated(
+        color_values = self.get_values_translated(
             output_sample_count=output_sample_count,
             output_domain=output_domain,
         )
-        with open(dest, 'w') as destfile:
-            destfile.write('LUT_3D_SIZE {}'.format(output_sample_count))
-            destfile.write('\n')
-            for color in color_value_gen:
-                line = ' '.join('{:.7g}'.format(v) for v in color)
-                destfile.write(line)
-                destfile.write('\n')
+        # Build the whole file as bytes and write it out in one call, as in
+        # write_3dl().
+        lines = ['LUT_3D_SIZE {}'.format(output_sample_count).encode('ascii')]
+        lines.extend(b'%.7g %.7g %.7g' % tuple(color) for color in color_values.tolist())
+        lines.append(b'')
+        with open(dest, 'wb') as destfile:
+            destfile.write(b'\n'.join(lines))
 
 
 @click.command()
@@ -352,7 +713,16 @@ class ColorLUT(object):
     help='Type of color LUT.  If this argument is not provided, the output type is inferred from the destination filename extension.',
     type=click.Choice(['3dl', 'haldclut', 'cube']),
 )
-def cli(src, dest, dest_type):
+@click.option(
+    '--verbose',
+    help='Print details about the source color LUT as it is read.',
+    is_flag=True,
+)
+def cli(src, dest, dest_type, verbose):
+    logging.basicConfig(
+        format='%(message)s',
+        level=logging.DEBUG if verbose else logging.WARNING,
+    )
     if not src:
         raise ValueError('Please specify a source LUT file.')
     if not dest:
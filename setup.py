@@ -1,15 +1,17 @@
-from setuptools import setup
+from setuptools import setup, find_packages
 setup(
     name="cluttool",
     version="wip", # i.e. this version doesn't even work yet.
     packages=find_packages(),
     entry_points={
         'gui_scripts': [
-            'cluttool = cluttool:cli',
+            'cluttool = cluttool.cluttool:cli',
         ]
     },
-    install_requires=['click>=6.7<8.0'],
-    install_requires=load_requirements('requirements/base.in'),
+    install_requires=['click>=6.7,<8.0', 'numpy', 'pypng'],
+    extras_require={
+        'numba': ['numba'],
+    },
     author="Troy Sankey",
     author_email="sankeytms@gmail.com",
     description="create and convert 3D/color LUTs",
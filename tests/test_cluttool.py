@@ -0,0 +1,205 @@
+import threading
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from cluttool import cluttool
+
+
+def make_lut(sample_count=5, input_domain=255.0, dtype=np.int64):
+    rng = np.random.default_rng(0)
+    if isinstance(input_domain, int):
+        data = rng.integers(0, input_domain, 3 * sample_count**3, dtype=dtype, endpoint=True)
+    else:
+        data = rng.uniform(0, input_domain, 3 * sample_count**3)
+    return cluttool.ColorLUT(data, sample_count=sample_count, input_domain=input_domain)
+
+
+def make_identity_lut(sample_count=5, input_domain=1.0):
+    steps = np.arange(sample_count) * (input_domain / (sample_count-1))
+    if isinstance(input_domain, int):
+        steps = np.rint(steps).astype(np.int64)
+    # Red increments fastest in the flat data, so the grid is laid out [b, g, r].
+    b, g, r = np.meshgrid(steps, steps, steps, indexing='ij')
+    data = np.stack([r, g, b], axis=-1).reshape(-1)
+    return cluttool.ColorLUT(data, sample_count=sample_count, input_domain=input_domain)
+
+
+class TetrahedralInterpolationTest(unittest.TestCase):
+    def test_grid_points(self):
+        # With an integer domain that the sample count divides evenly, every
+        # grid point is located exactly and reproduces its sample.
+        lut = make_lut(sample_count=5, input_domain=256)
+        idx = np.arange(5)
+        r, g, b = np.meshgrid(idx, idx, idx, indexing='ij')
+        values = lut.get_tetrahedral_color_value(r*64, g*64, b*64)
+        np.testing.assert_array_equal(values, lut.cube)
+
+    def test_identity(self):
+        lut = make_identity_lut()
+        rng = np.random.default_rng(1)
+        r, g, b = rng.uniform(0, 1, (3, 100))
+        values = lut.get_tetrahedral_color_value(r, g, b)
+        np.testing.assert_allclose(values, np.stack([r, g, b], axis=-1), rtol=0, atol=1e-12)
+
+    def test_scalar_and_batched_inputs_agree(self):
+        lut = make_lut()
+        rng = np.random.default_rng(2)
+        r, g, b = rng.uniform(0, 255, (3, 20))
+        batched = lut.get_tetrahedral_color_value(r, g, b)
+        self.assertEqual(batched.shape, (20, 3))
+        for i in range(20):
+            np.testing.assert_array_equal(lut.get_tetrahedral_color_value(r[i], g[i], b[i]), batched[i])
+
+
+class ApplyToImageTest(unittest.TestCase):
+    def make_image(self, dtype, max_value, height=7, width=9):
+        rng = np.random.default_rng(3)
+        if np.issubdtype(dtype, np.integer):
+            return rng.integers(0, max_value, (height, width, 3), dtype=dtype, endpoint=True)
+        return rng.uniform(0, max_value, (height, width, 3)).astype(dtype)
+
+    def test_identity_8bit(self):
+        # 8-bit images are interpolated in float32.
+        lut = make_identity_lut(sample_count=4, input_domain=255)
+        image = self.make_image(np.uint8, 255)
+        result = lut.apply_to_image(image)
+        self.assertEqual(result.dtype, np.uint8)
+        np.testing.assert_array_equal(result, image)
+
+    def test_identity_16bit(self):
+        # 16-bit images are located exactly in integer arithmetic.
+        lut = make_identity_lut(sample_count=4, input_domain=65535)
+        image = self.make_image(np.uint16, 65535)
+        result = lut.apply_to_image(image)
+        self.assertEqual(result.dtype, np.uint16)
+        np.testing.assert_array_equal(result, image)
+
+    def test_integer_results_are_rounded(self):
+        lut = make_lut(sample_count=5, input_domain=65535)
+        image = self.make_image(np.uint16, 65535)
+        values = lut.get_interpolated_color_value(image[..., 0], image[..., 1], image[..., 2])
+        np.testing.assert_array_equal(lut.apply_to_image(image), np.rint(values))
+
+    def test_8bit_results_are_rounded_from_float32(self):
+        lut = make_lut(sample_count=5, input_domain=255)
+        image = self.make_image(np.uint8, 255)
+        pixels = image.astype(np.float32)
+        values = lut.get_interpolated_color_value(pixels[..., 0], pixels[..., 1], pixels[..., 2])
+        np.testing.assert_array_equal(lut.apply_to_image(image), np.rint(values))
+
+    def test_float_image(self):
+        lut = make_lut()
+        image = self.make_image(np.float64, 255.0)
+        result = lut.apply_to_image(image)
+        self.assertEqual(result.shape, image.shape)
+        self.assertEqual(result.dtype, image.dtype)
+        values = lut.get_interpolated_color_value(image[..., 0], image[..., 1], image[..., 2])
+        np.testing.assert_array_equal(result, values)
+
+    def test_tetrahedral(self):
+        lut = make_lut()
+        image = self.make_image(np.float64, 255.0)
+        values = lut.get_tetrahedral_color_value(image[..., 0], image[..., 1], image[..., 2])
+        np.testing.assert_array_equal(lut.apply_to_image(image, interpolation='tetrahedral'), values)
+
+    def test_chunk_boundaries(self):
+        # 63 pixels do not divide evenly into chunks of 10.
+        lut = make_lut(input_domain=255)
+        image = self.make_image(np.uint8, 255)
+        expected = lut.apply_to_image(image)
+        with mock.patch.object(cluttool, 'APPLY_CHUNK_SIZE', 10):
+            np.testing.assert_array_equal(lut.apply_to_image(image), expected)
+
+    def test_invalid_shape(self):
+        lut = make_lut()
+        for shape in [(4, 4), (4, 4, 4), (4, 4, 3, 1)]:
+            with self.assertRaises(ValueError):
+                lut.apply_to_image(np.zeros(shape))
+
+    def test_invalid_interpolation(self):
+        with self.assertRaises(ValueError):
+            make_lut().apply_to_image(np.zeros((2, 2, 3)), interpolation='cubic')
+
+
+@unittest.skipUnless(cluttool._load_numba(), 'numba is not installed')
+class CompiledInterpolationTest(unittest.TestCase):
+    """
+    The numba kernels must give the same results as the NumPy code they
+    stand in for.
+    """
+    def assert_paths_agree(self, lut, *inputs, rtol=1e-12):
+        compiled = lut.get_interpolated_color_value(*inputs)
+        with mock.patch.object(cluttool, '_load_numba', return_value=False):
+            expected = lut.get_interpolated_color_value(*inputs)
+        self.assertEqual(compiled.shape, expected.shape)
+        self.assertEqual(compiled.dtype, expected.dtype)
+        np.testing.assert_allclose(compiled, expected, rtol=rtol)
+
+    def test_concurrent_first_load(self):
+        errors = []
+
+        def load():
+            try:
+                self.assertTrue(cluttool._load_numba())
+            except Exception as error:
+                errors.append(error)
+
+        cluttool._load_numba.cache_clear()
+        threads = [threading.Thread(target=load) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assert_paths_agree(make_lut(), 10.0, 20.0, 30.0)
+
+    def test_scalars(self):
+        self.assert_paths_agree(make_lut(), 10.0, 20.0, 30.0)
+
+    def test_arrays(self):
+        lut = make_lut()
+        values = np.linspace(0, 255, 24).reshape(4, 6)
+        self.assert_paths_agree(lut, values, values[::-1], values.T.reshape(4, 6))
+
+    def test_broadcast_inputs(self):
+        lut = make_lut()
+        values = np.linspace(0, 255, 6)
+        self.assert_paths_agree(lut, values, 10.0, 20.0)
+        self.assert_paths_agree(lut, 10.0, values, values)
+        self.assert_paths_agree(lut, values[:, np.newaxis], values, 128.0)
+
+    def test_sequences(self):
+        self.assert_paths_agree(make_lut(), [10.0, 20.0], [30.0, 40.0], [50.0, 60.0])
+
+    def test_mixed_precision(self):
+        lut = make_lut()
+        values = np.linspace(0, 255, 7)
+        # The NumPy path locates float32 inputs in float32, so the results
+        # only agree to float32 precision, but must not be narrowed to it.
+        self.assert_paths_agree(lut, values.astype(np.float32), values, values, rtol=1e-6)
+        # Nor may float32 inputs narrow the results of a float64 LUT.
+        single = values.astype(np.float32)
+        self.assert_paths_agree(lut, single, single, single, rtol=1e-6)
+        self.assert_paths_agree(lut, single[3], single[2], single[1], rtol=1e-6)
+        # A LUT of 8-bit samples is interpolated in float32 for float32 inputs.
+        lut = make_lut(input_domain=255, dtype=np.uint8)
+        self.assert_paths_agree(lut, single, single[::-1], single, rtol=1e-6)
+        self.assert_paths_agree(lut, single[3], single[2], single[1], rtol=1e-6)
+
+    def test_integer_inputs(self):
+        # Integer inputs to an integer LUT are located exactly, whether or
+        # not numba is installed.
+        lut = make_lut(input_domain=255)
+        values = np.arange(0, 256, 5, dtype=np.uint8)
+        self.assert_paths_agree(lut, values, values[::-1], 64, rtol=0)
+        self.assert_paths_agree(lut, 191, 127, 63, rtol=0)
+        lut = make_lut(sample_count=17, input_domain=65535)
+        values = np.arange(0, 65536, 257, dtype=np.uint16)
+        self.assert_paths_agree(lut, values, values[::-1], values[::3].repeat(3)[:values.size], rtol=0)
+        self.assert_paths_agree(lut, np.uint16(65535), np.uint16(1), 40000, rtol=0)
+
+
+if __name__ == '__main__':
+    unittest.main()